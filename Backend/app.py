@@ -1,20 +1,46 @@
 import os
 import io
-import base64
+import asyncio
+import hashlib
+import shutil
+import tempfile
+import uuid
+import zlib
+from contextlib import asynccontextmanager, suppress
 import cv2
 import numpy as np
 import smtplib
 from email.message import EmailMessage
-from fastapi import FastAPI, File, UploadFile
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, File, Form, UploadFile
+from fastapi.responses import FileResponse, JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from ultralytics import YOLO
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
 from dotenv import load_dotenv
 
+# pybase64 uses SIMD (AVX2/NEON) and is much faster on large images/PDFs.
+# Fall back to the stdlib module if it isn't installed.
+try:
+    import pybase64 as base64
+except ImportError:
+    import base64
+
+# orjson serializes the large base64-laden /api/predict responses much faster than json.dumps.
+try:
+    import orjson  # noqa: F401
+    from fastapi.responses import ORJSONResponse as DefaultResponse
+except ImportError:
+    DefaultResponse = JSONResponse
+
+# PyTurboJPEG calls libjpeg-turbo's SIMD encoder directly and is faster than
+# cv2.imencode. Optional: falls back to OpenCV if the package or library is missing.
+try:
+    from turbojpeg import TurboJPEG, TJSAMP_420
+    _tj = TurboJPEG()
+except Exception:
+    _tj = None
+
 # Load environment variables from .env (if present)
 load_dotenv()
 
@@ -37,13 +63,45 @@ os.makedirs(PDF_DIR, exist_ok=True)
 # Model path (adjust if you store model elsewhere)
 MODEL_PATH = os.path.join(BASE_DIR, "..", "Model", "Yolov8-fintuned-on-potholes.pt")
 
+# Export the model to TensorRT/ONNX at startup and load the compiled artifact.
+# Off by default: needs the backends from requirements-export.txt installed first.
+MODEL_EXPORT = os.getenv("MODEL_EXPORT", "false").lower() in ("1", "true", "yes")
+# Inference size the exported model is built for; predict calls must use the same value.
+MODEL_IMGSZ = 640
+MODEL_MAX_BATCH = int(os.getenv("MODEL_MAX_BATCH") or 8)
+# Dataset yaml used to calibrate the INT8 OpenVINO export on CPU-only hosts. INT8 is
+# only tried when this is set, and it should point at pothole images that match real
+# inputs; otherwise CPU hosts use the FP32 ONNX export.
+INT8_CALIB_DATA = os.getenv("INT8_CALIB_DATA")
+# Warm up the model with dummy inferences at startup.
+WARMUP = os.getenv("WARMUP", "true").lower() in ("1", "true", "yes")
+
 # Control whether app writes files to disk. Default: no (safe for ephemeral hosts).
 SAVE_OUTPUTS = os.getenv("SAVE_OUTPUTS", "false").lower() in ("1", "true", "yes")
 
+# JPEG quality for result images. 80 is plenty for previews and much cheaper than the default 95.
+JPEG_QUALITY = int(os.getenv("JPEG_QUALITY") or 80)
+
 # -----------------------
 # FastAPI setup
 # -----------------------
-app = FastAPI(title="Pothole Detection Full App")
+@asynccontextmanager
+async def lifespan(app):
+    # Keep the pooled SMTP connection (see send_email) alive while the app runs,
+    # and close it on shutdown.
+    keepalive_task = asyncio.create_task(_smtp_keepalive())
+    try:
+        yield
+    finally:
+        keepalive_task.cancel()
+        # wait for an in-flight NOOP thread to finish before closing the socket from another thread
+        with suppress(asyncio.CancelledError):
+            await keepalive_task
+        async with _smtp_lock:
+            await asyncio.to_thread(_close_smtp_conn)
+
+
+app = FastAPI(title="Pothole Detection Full App", default_response_class=DefaultResponse, lifespan=lifespan)
 
 # Allow CORS so your HTML frontend (hosted elsewhere) can call this API.
 app.add_middleware(
@@ -51,6 +109,7 @@ app.add_middleware(
     allow_origins=["*"],  # for production, lock this down to your frontend domain
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Pothole-Count"],  # returned by /api/predict_single
 )
 
 # Mount static only so legacy disk-based URLs continue to work if SAVE_OUTPUTS is true.
@@ -69,9 +128,118 @@ async def serve_index():
 # -----------------------
 # We load the model once at startup. If your model is large, consider downloading it
 # from remote storage during deployment instead of committing it to the repo.
-model = YOLO(MODEL_PATH)
+def _model_fingerprint():
+    """sha256 of the .pt checkpoint, recorded next to each export to detect stale caches."""
+    h = hashlib.sha256()
+    with open(MODEL_PATH, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _remove_path(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def _export_model(fmt, export_path, export_kwargs):
+    """
+    Export MODEL_PATH to `export_path`. The export runs on a copy of the .pt in a
+    temporary directory and is only moved into place once it has finished, so an
+    interrupted export never leaves a truncated artifact behind.
+    """
+    tmp_dir = tempfile.mkdtemp(prefix=".export_", dir=os.path.dirname(export_path))
+    try:
+        tmp_pt = os.path.join(tmp_dir, os.path.basename(MODEL_PATH))
+        shutil.copy2(MODEL_PATH, tmp_pt)
+        # dynamic batch (up to MODEL_MAX_BATCH) so /api/predict can send any number of images
+        exported = YOLO(tmp_pt).export(
+            format=fmt, imgsz=MODEL_IMGSZ, dynamic=True, batch=MODEL_MAX_BATCH, **export_kwargs
+        )
+        _remove_path(export_path)
+        os.replace(exported, export_path)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def _dummy_predict(m):
+    """Run one inference on a blank image at the export size."""
+    dummy = np.zeros((MODEL_IMGSZ, MODEL_IMGSZ, 3), dtype=np.uint8)
+    m.predict(dummy, conf=0.05, save=False, imgsz=MODEL_IMGSZ, verbose=False)
+
+
+def load_model():
+    """
+    Load the YOLO model, preferring a compiled export next to the .pt checkpoint:
+    TensorRT (.engine, FP16) when a GPU is available, otherwise ONNX for CPU inference
+    (preceded by OpenVINO INT8 if INT8_CALIB_DATA is set). The export is created on first startup and reused
+    afterwards; it is redone if the .pt has changed since (tracked in a
+    `<export>.source` file holding the checkpoint's sha256). Each candidate is
+    loaded and smoke-tested with one inference; if exporting, loading or the test
+    fails we move on to the next candidate and finally to the raw .pt.
+    Set MODEL_EXPORT=false to always use the .pt.
+    """
+    if not MODEL_EXPORT:
+        return YOLO(MODEL_PATH)
+
+    import torch
+
+    stem = os.path.splitext(MODEL_PATH)[0]
+    if torch.cuda.is_available():
+        candidates = [("engine", stem + ".engine", {"half": True})]
+    else:
+        candidates = [("onnx", stem + ".onnx", {})]
+        if INT8_CALIB_DATA:
+            candidates.insert(0, ("openvino", stem + "_int8_openvino_model", {"int8": True, "data": INT8_CALIB_DATA}))
+
+    fingerprint = _model_fingerprint()
+    for fmt, export_path, export_kwargs in candidates:
+        source_path = export_path + ".source"
+        try:
+            with open(source_path) as f:
+                cached_fingerprint = f.read().strip()
+        except OSError:
+            cached_fingerprint = None
+
+        if not os.path.exists(export_path) or cached_fingerprint != fingerprint:
+            if os.path.exists(export_path):
+                print(f"[INFO] {export_path} is out of date with {MODEL_PATH}, re-exporting")
+            try:
+                _export_model(fmt, export_path, export_kwargs)
+                with open(source_path, "w") as f:
+                    f.write(fingerprint)
+            except Exception as e:
+                print(f"[WARN] Failed to export model to {fmt}: {e}")
+                continue
+
+        try:
+            candidate = YOLO(export_path, task="detect")
+            _dummy_predict(candidate)
+        except Exception as e:
+            print(f"[WARN] Failed to load exported model {export_path}: {e}")
+            continue
+        return candidate
+
+    print("[WARN] No exported model available, using PyTorch weights")
+    return YOLO(MODEL_PATH)
+
+
+model = load_model()
 print("[INFO] Loaded model:", getattr(model, "names", "unknown"))
 
+# Run a couple of dummy inferences so allocation/autotuning happens now rather than
+# on the first user request. Set WARMUP=false to skip (e.g. for faster dev reloads).
+if WARMUP:
+    try:
+        for _ in range(2):
+            _dummy_predict(model)
+        print("[INFO] Model warmed up")
+    except Exception as e:
+        # a failed warmup shouldn't take the whole app down; requests will surface real errors
+        print(f"[WARN] Model warmup failed: {e}")
+
 
 # -----------------------
 # Helper utilities
@@ -91,73 +259,152 @@ def numpy_from_bytes(image_bytes: bytes):
     return img_np
 
 
-def encode_image_to_data_uri(img_np, ext=".jpg"):
-    """Encode a BGR numpy image to a data URI (base64)."""
-    success, encoded = cv2.imencode(ext, img_np)
+def encode_image_buffer(img_np, ext=".jpg"):
+    """
+    Encode a BGR numpy image (JPEG by default) and return the encoded data as a
+    buffer-protocol object (bytes or a memoryview over cv2's output array), without
+    copying it into a new bytes object.
+    """
+    is_jpeg = ext.lower() in (".jpg", ".jpeg")
+    if is_jpeg and _tj is not None:
+        return _tj.encode(img_np, quality=JPEG_QUALITY, jpeg_subsample=TJSAMP_420)
+
+    params = [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY, int(cv2.IMWRITE_JPEG_OPTIMIZE), 0] if is_jpeg else []
+    success, encoded = cv2.imencode(ext, img_np, params)
     if not success:
         raise RuntimeError("Image encoding failed")
-    img_bytes = encoded.tobytes()
-    b64 = base64.b64encode(img_bytes).decode("utf-8")
+    return encoded.data
+
+
+def encode_image(img_np, ext=".jpg"):
+    """Encode a BGR numpy image to raw image bytes (JPEG by default)."""
+    return bytes(encode_image_buffer(img_np, ext))
+
+
+def encode_image_to_data_uri(img_np, ext=".jpg"):
+    """
+    Encode a BGR numpy image to a data URI (base64). Also returns the encoded image
+    as a buffer (see encode_image_buffer); call bytes() on it if you need bytes.
+    """
+    img_buf = encode_image_buffer(img_np, ext)
+    b64 = base64.b64encode(img_buf).decode("utf-8")
     mime = "image/jpeg" if ext.lower() in (".jpg", ".jpeg") else "image/png"
-    return f"data:{mime};base64,{b64}", img_bytes
+    return f"data:{mime};base64,{b64}", img_buf
 
 
-# -----------------------
-# PREDICTION ENDPOINT (in-memory by default)
-# -----------------------
-@app.post("/api/predict")
-async def predict(images: list[UploadFile] = File(...)):
+BOX_COLOR = (0, 255, 0)  # BGR
+
+
+def resize_for_model(img_np):
     """
-    Accept multiple uploaded images, run YOLO, and return:
-      - original_filename
-      - result_image_data_uri  (base64 data URI for immediate display in browser)
-      - optional result_image_url (only present if SAVE_OUTPUTS is true)
-      - count (number of boxes)
-    By default we do not write results/uploads to disk. Set SAVE_OUTPUTS=true to enable legacy file-saving.
+    Downscale a BGR image so its longest side is MODEL_IMGSZ, keeping the aspect ratio.
+    cv2.resize is much cheaper than pushing multi-megapixel photos through ultralytics'
+    preprocessing, which then only has to pad. Returns (resized_img, scale).
     """
-    results_list = []
+    h, w = img_np.shape[:2]
+    scale = MODEL_IMGSZ / max(h, w)
+    if scale >= 1:
+        return img_np, 1.0
+    new_size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    return cv2.resize(img_np, new_size, interpolation=cv2.INTER_LINEAR), scale
 
-    for upload in images:
-        filename = upload.filename.replace("/", "_")
-        contents = await upload.read()  # raw bytes
 
-        # Convert to numpy array for model
-        try:
-            img_np = numpy_from_bytes(contents)
-        except Exception as e:
-            return JSONResponse({"error": f"Failed to decode {filename}: {str(e)}"}, status_code=400)
+def draw_boxes(img_np, result, scale=1.0):
+    """
+    Draw the detected boxes and "<class> <conf>" labels onto a copy of the BGR image.
+    Replaces result.plot(): box data is pulled out once as contiguous numpy arrays and
+    drawn with OpenCV, instead of ultralytics' per-box PIL Annotator.
+    `scale` is the factor the model input was resized by (see resize_for_model);
+    boxes are mapped back by 1/scale so they can be drawn on the original image.
+    """
+    plotted = img_np.copy()
+    boxes = result.boxes.xyxy.cpu().numpy()
+    if scale != 1.0:
+        boxes = boxes / scale
+    boxes = boxes.astype(np.int32)
+    confs = result.boxes.conf.cpu().numpy()
+    classes = result.boxes.cls.cpu().numpy().astype(np.int32)
+    names = result.names or {}
+
+    for (x1, y1, x2, y2), conf, cls in zip(boxes.tolist(), confs.tolist(), classes.tolist()):
+        cv2.rectangle(plotted, (x1, y1), (x2, y2), BOX_COLOR, 2)
+        label = f"{names.get(cls, cls)} {conf:.2f}"
+        (tw, th), baseline = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
+        ty = max(y1, th + baseline)
+        cv2.rectangle(plotted, (x1, ty - th - baseline), (x1 + tw, ty), BOX_COLOR, -1)
+        cv2.putText(plotted, label, (x1, ty - baseline), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1, cv2.LINE_AA)
+    return plotted
+
+
+def unique_filename(filename):
+    """
+    Prefix `filename` with a random id so saved outputs never collide, e.g. when several
+    uploads in one batch share a name (some mobile browsers call every photo image.jpg).
+    """
+    return f"{uuid.uuid4().hex[:8]}_{filename}"
 
-        # Optionally save the raw upload (legacy mode)
-        upload_path = None
-        if SAVE_OUTPUTS:
-            upload_path = os.path.join(UPLOAD_DIR, filename)
-            try:
-                with open(upload_path, "wb") as f:
-                    f.write(contents)
-            except Exception as e:
-                # don't break the whole loop on save errors; just warn
-                print(f"[WARN] Failed to save upload {upload_path}: {e}")
-                upload_path = None
 
-        # Run YOLO on the in-memory numpy image
-        # Note: ultralytics accepts numpy arrays as input
-        results = model.predict(img_np, conf=0.05, save=False)
-        result = results[0]
+def save_upload(filename, contents):
+    """
+    Write raw upload bytes to UPLOAD_DIR (legacy SAVE_OUTPUTS mode) under a unique name,
+    so parallel saves of same-named uploads don't clobber each other; warn on failure.
+    """
+    upload_path = os.path.join(UPLOAD_DIR, unique_filename(filename))
+    try:
+        with open(upload_path, "wb") as f:
+            f.write(contents)
+    except Exception as e:
+        # don't break the whole request on save errors; just warn
+        print(f"[WARN] Failed to save upload {upload_path}: {e}")
 
-        # result.plot() returns an image (BGR numpy array)
-        plotted = result.plot()
+
+async def decode_all(contents_list):
+    """
+    Convert raw upload bytes to numpy arrays for the model. cv2.imdecode releases the GIL,
+    so all uploads are decoded concurrently on worker threads. Failed decodes are returned
+    as the exception instance in place of the array.
+    """
+    return await asyncio.gather(
+        *[asyncio.to_thread(numpy_from_bytes, contents) for contents in contents_list],
+        return_exceptions=True,
+    )
+
+
+def run_model(img_list):
+    """Run YOLO on a list of in-memory numpy images and return one result per image."""
+    # Note: ultralytics batches list inputs natively; chunk to the exported model's max batch.
+    # Inputs are deliberately plain numpy arrays, not pinned buffers: ultralytics letterboxes
+    # and np.stack()s them into a fresh array before the host-to-device copy, so pinning
+    # the source would not reach the transfer.
+    results = []
+    for i in range(0, len(img_list), MODEL_MAX_BATCH):
+        results.extend(model.predict(img_list[i:i + MODEL_MAX_BATCH], conf=0.05, save=False, imgsz=MODEL_IMGSZ))
+    return results
+
+
+def render_result_jpeg(img_np, result, scale=1.0):
+    """Draw boxes on `img_np` (see draw_boxes for `scale`) and return JPEG bytes."""
+    return encode_image(draw_boxes(img_np, result, scale), ext=".jpg")
+
+
+def build_result(filename, img_np, result, scale, include_image):
+    """
+    Build the /api/predict response entry for one image: draw boxes on `img_np`
+    (see draw_boxes for `scale`), encode to a data URI and optionally save to disk.
+    """
+    data_uri = None
+    result_url = None
+
+    if include_image:
+        plotted = draw_boxes(img_np, result, scale)
 
         # Encode plotted image to base64 data URI for frontend
-        try:
-            data_uri, img_bytes = encode_image_to_data_uri(plotted, ext=".jpg")
-        except Exception as e:
-            return JSONResponse({"error": f"Failed to encode result image: {e}"}, status_code=500)
+        data_uri, _ = encode_image_to_data_uri(plotted, ext=".jpg")
 
         # Optionally write the result image to disk (legacy)
-        result_url = None
         if SAVE_OUTPUTS:
             try:
-                output_filename = "result_" + filename
+                output_filename = "result_" + unique_filename(filename)
                 output_path = os.path.join(RESULT_DIR, output_filename)
                 cv2.imwrite(output_path, plotted)
                 result_url = f"/static/results/{output_filename}"
@@ -165,17 +412,113 @@ async def predict(images: list[UploadFile] = File(...)):
                 print(f"[WARN] Failed to save result {output_path}: {e}")
                 result_url = None
 
-        results_list.append({
-            "original_filename": filename,
-            "result_image_data_uri": data_uri,
-            "result_image_url": result_url,
-            "count": len(result.boxes),
-            "detections": []  # keep this for compatibility with your frontend
-        })
+    return {
+        "original_filename": filename,
+        "result_image_data_uri": data_uri,
+        "result_image_url": result_url,
+        "count": len(result.boxes),
+        "detections": []  # keep this for compatibility with your frontend
+    }
+
+
+# -----------------------
+# PREDICTION ENDPOINT (in-memory by default)
+# -----------------------
+@app.post("/api/predict")
+async def predict(images: list[UploadFile] = File(...), include_image: bool = True, full_res: bool = True):
+    """
+    Accept multiple uploaded images, run YOLO, and return:
+      - original_filename
+      - result_image_data_uri  (base64 data URI for immediate display in browser)
+      - optional result_image_url (only present if SAVE_OUTPUTS is true)
+      - count (number of boxes)
+    By default we do not write results/uploads to disk. Set SAVE_OUTPUTS=true to enable legacy file-saving.
+    Pass ?include_image=false to skip drawing/encoding the annotated image when only counts are needed;
+    result_image_data_uri and result_image_url are then null.
+    Pass ?full_res=false to draw on the downscaled model input instead of the original image
+    (smaller and faster to encode).
+    """
+    filenames = []
+    contents_list = []
+
+    for upload in images:
+        filenames.append(upload.filename.replace("/", "_"))
+        contents_list.append(await upload.read())  # raw bytes
+
+    decoded = await decode_all(contents_list)
+    for filename, img_np in zip(filenames, decoded):
+        if isinstance(img_np, Exception):
+            return JSONResponse({"error": f"Failed to decode {filename}: {str(img_np)}"}, status_code=400)
+    img_list = list(decoded)
+
+    # Optionally save the raw uploads (legacy mode), only once every upload decoded.
+    # Disk writes are blocking, so run them on worker threads.
+    if SAVE_OUTPUTS:
+        await asyncio.gather(
+            *[asyncio.to_thread(save_upload, filename, contents) for filename, contents in zip(filenames, contents_list)]
+        )
+
+    model_inputs, scales = zip(*[resize_for_model(img_np) for img_np in img_list])
+    results = run_model(list(model_inputs))
+
+    # Drawing, JPEG and base64 encoding all release the GIL, so build each image's
+    # response entry concurrently on worker threads.
+    built = await asyncio.gather(
+        *[
+            asyncio.to_thread(
+                build_result,
+                filename,
+                img_np if full_res else model_img,
+                result,
+                scale if full_res else 1.0,
+                include_image,
+            )
+            for filename, img_np, model_img, scale, result in zip(filenames, img_list, model_inputs, scales, results)
+        ],
+        return_exceptions=True,
+    )
+    for entry in built:
+        if isinstance(entry, Exception):
+            return JSONResponse({"error": f"Failed to encode result image: {entry}"}, status_code=500)
+    results_list = list(built)
 
     return {"results": results_list}
 
 
+@app.post("/api/predict_single")
+async def predict_single(image: UploadFile = File(...)):
+    """
+    Preferred endpoint for a single image: run YOLO and return the annotated result
+    as raw image/jpeg bytes (no base64 data URI, ~33% smaller response).
+    The number of boxes is returned in the X-Pothole-Count header.
+    """
+    filename = image.filename.replace("/", "_")
+    contents = await image.read()
+
+    try:
+        img_np = await asyncio.to_thread(numpy_from_bytes, contents)
+    except Exception as e:
+        return JSONResponse({"error": f"Failed to decode {filename}: {str(e)}"}, status_code=400)
+
+    model_img, scale = resize_for_model(img_np)
+    result = model.predict(model_img, conf=0.05, save=False, imgsz=MODEL_IMGSZ)[0]
+
+    # Drawing and JPEG encoding are blocking, so run them on a worker thread
+    try:
+        img_bytes = await asyncio.to_thread(render_result_jpeg, img_np, result, scale)
+    except Exception as e:
+        return JSONResponse({"error": f"Failed to encode result image: {e}"}, status_code=500)
+
+    return Response(
+        content=img_bytes,
+        media_type="image/jpeg",
+        headers={
+            "Cache-Control": "no-store",
+            "X-Pothole-Count": str(len(result.boxes)),
+        },
+    )
+
+
 # -----------------------
 # COMPLAINT GENERATOR
 # -----------------------
@@ -218,6 +561,70 @@ class PDFRequest(BaseModel):
     complaint_text: str
 
 
+# The complaint PDF is a single A4 page of plain Helvetica text, so we write the PDF
+# bytes directly instead of going through reportlab's canvas machinery. Everything
+# except the content stream is identical across requests and is built once here.
+PDF_FONT_SIZE = 12
+PDF_LINE_HEIGHT = 14
+PDF_MARGIN_X = 40
+PDF_START_Y = 800
+
+_PDF_HEADER = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+_PDF_STATIC_OBJECTS = [
+    b"<< /Type /Catalog /Pages 2 0 R >>",
+    b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+    b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595.2756 841.8898] "
+    b"/Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>",  # A4
+    b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+]
+
+
+def _build_pdf_template():
+    """Serialize the header and static objects 1-4; return (bytes, object offsets)."""
+    out = bytearray(_PDF_HEADER)
+    offsets = []
+    for num, body in enumerate(_PDF_STATIC_OBJECTS, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (num, body)
+    return bytes(out), offsets
+
+
+_PDF_TEMPLATE, _PDF_TEMPLATE_OFFSETS = _build_pdf_template()
+
+
+def _pdf_escape(line):
+    """Encode a text line as a PDF literal string (WinAnsi, unsupported chars -> '?')."""
+    data = line.encode("cp1252", errors="replace")
+    return data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)").replace(b"\r", b"")
+
+
+def build_text_pdf(text):
+    """Render `text` as one line per row of Helvetica on a single A4 page; return PDF bytes."""
+    content = bytearray(
+        b"BT\n/F1 %d Tf\n%d TL\n%d %d Td\n" % (PDF_FONT_SIZE, PDF_LINE_HEIGHT, PDF_MARGIN_X, PDF_START_Y)
+    )
+    for i, line in enumerate(text.split("\n")):
+        if i:
+            content += b"T*\n"
+        content += b"(%s) Tj\n" % _pdf_escape(line.rstrip())
+    content += b"ET"
+    stream = zlib.compress(bytes(content))
+
+    out = bytearray(_PDF_TEMPLATE)
+    offsets = list(_PDF_TEMPLATE_OFFSETS)
+    offsets.append(len(out))
+    out += b"5 0 obj\n<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream)
+    out += stream
+    out += b"\nendstream\nendobj\n"
+
+    xref_offset = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(offsets) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(offsets) + 1, xref_offset)
+    return bytes(out)
+
+
 @app.post("/api/generate_pdf")
 async def generate_pdf(req: PDFRequest):
     """
@@ -226,19 +633,7 @@ async def generate_pdf(req: PDFRequest):
       - pdf_url (only if SAVE_OUTPUTS is true and file was written to disk)
     """
     # Create PDF in memory
-    buffer = io.BytesIO()
-    c = canvas.Canvas(buffer, pagesize=A4)
-    text_obj = c.beginText(40, 800)
-    text_obj.setFont("Helvetica", 12)
-
-    for line in req.complaint_text.split("\n"):
-        text_obj.textLine(line.rstrip())
-
-    c.drawText(text_obj)
-    c.showPage()
-    c.save()
-    buffer.seek(0)
-    pdf_bytes = buffer.read()
+    pdf_bytes = build_text_pdf(req.complaint_text)
 
     # Optionally write to disk (legacy)
     pdf_url = None
@@ -262,6 +657,9 @@ async def generate_pdf(req: PDFRequest):
 # -----------------------
 # EMAIL SENDER (in-memory attachments preferred)
 # -----------------------
+DATA_URI_MAX_HEADER = 64
+
+
 class EmailRequest(BaseModel):
     to_email: str
     subject: str
@@ -270,6 +668,135 @@ class EmailRequest(BaseModel):
     image_data_b64: list[str] = []     # preferred: data URIs from /api/predict
 
 
+# Reuse one SMTP connection across requests instead of paying for the TLS handshake
+# and AUTH on every email. Guarded by a lock since smtplib connections aren't shareable.
+SMTP_KEEPALIVE_SECONDS = 60
+# Socket timeout for the pooled connection, so a connection silently dropped by a
+# NAT/firewall raises (and gets replaced) instead of blocking on TCP retransmits.
+SMTP_TIMEOUT_SECONDS = float(os.getenv("SMTP_TIMEOUT_SECONDS") or 30)
+_smtp_lock = asyncio.Lock()
+_smtp_conn = None
+_smtp_conn_key = None
+
+
+def _close_smtp_conn():
+    """Drop the pooled SMTP connection (call with _smtp_lock held)."""
+    global _smtp_conn, _smtp_conn_key
+    if _smtp_conn is not None:
+        try:
+            _smtp_conn.quit()
+        except Exception:
+            pass
+    _smtp_conn = None
+    _smtp_conn_key = None
+
+
+def _get_smtp_conn(host, port, username, password):
+    """Return a live pooled SMTP connection, reconnecting if needed (call with _smtp_lock held)."""
+    global _smtp_conn, _smtp_conn_key
+    key = (host, port, username, password)
+    if _smtp_conn is not None:
+        if _smtp_conn_key != key:
+            _close_smtp_conn()
+        else:
+            try:
+                _smtp_conn.noop()
+            except (smtplib.SMTPException, OSError):
+                _close_smtp_conn()
+
+    if _smtp_conn is None:
+        server = smtplib.SMTP(host, port, timeout=SMTP_TIMEOUT_SECONDS)
+        try:
+            server.starttls()
+            if username and password:
+                server.login(username, password)
+        except Exception:
+            # don't leak the socket when TLS or AUTH fails (e.g. bad credentials)
+            server.close()
+            raise
+        _smtp_conn = server
+        _smtp_conn_key = key
+    return _smtp_conn
+
+
+def _send_message_sync(msg, host, port, username, password):
+    """Send over the pooled connection; reconnect once if the server dropped it (call with _smtp_lock held)."""
+    server = _get_smtp_conn(host, port, username, password)
+    try:
+        server.send_message(msg)
+    except smtplib.SMTPServerDisconnected:
+        _close_smtp_conn()
+        server = _get_smtp_conn(host, port, username, password)
+        server.send_message(msg)
+
+
+def _smtp_noop_sync():
+    """NOOP the pooled connection, dropping it if it's dead (call with _smtp_lock held)."""
+    if _smtp_conn is not None:
+        try:
+            _smtp_conn.noop()
+        except (smtplib.SMTPException, OSError):
+            _close_smtp_conn()
+
+
+def _read_file_sync(filepath):
+    with open(filepath, "rb") as f:
+        return f.read()
+
+
+async def _smtp_keepalive():
+    """Periodically NOOP the pooled SMTP connection so the server doesn't time it out."""
+    while True:
+        await asyncio.sleep(SMTP_KEEPALIVE_SECONDS)
+        async with _smtp_lock:
+            await asyncio.to_thread(_smtp_noop_sync)
+
+
+def build_email_message(to_email, subject, body):
+    """Create an EmailMessage with the configured sender, ready for attachments."""
+    msg = EmailMessage()
+    msg["From"] = os.getenv("FROM_EMAIL") or os.getenv("SMTP_USERNAME") or "no-reply@example.com"
+    msg["To"] = to_email
+    msg["Subject"] = subject
+    msg.set_content(body)
+    return msg
+
+
+def add_image_attachment(msg, data, subtype, filename):
+    """
+    Attach image bytes to `msg`. Equivalent to msg.add_attachment(data, maintype="image", ...)
+    but the base64 body is produced by (py)base64 in one call instead of the email package's
+    per-line pure-Python encoder, which dominates on multi-MB attachments.
+    """
+    part = EmailMessage()
+    part["Content-Type"] = f"image/{subtype}"
+    part["Content-Transfer-Encoding"] = "base64"
+    part.add_header("Content-Disposition", "attachment", filename=filename)
+    part.set_payload(base64.encodebytes(data).decode("ascii"))
+    if not msg.is_multipart():
+        msg.make_mixed()
+    msg.attach(part)
+
+
+async def deliver_email(msg):
+    """Send a message using the SMTP settings from the environment."""
+    SMTP_HOST = os.getenv("SMTP_HOST")
+    SMTP_PORT = int(os.getenv("SMTP_PORT") or 587)
+    SMTP_USERNAME = os.getenv("SMTP_USERNAME")
+    SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+
+    # Basic debug prints (safe-ish). Remove in production if sensitive.
+    print("SMTP_HOST:", SMTP_HOST)
+    print("SMTP_USERNAME:", SMTP_USERNAME)
+    if SMTP_PASSWORD:
+        print("SMTP_PASSWORD: [REDACTED]")
+
+    # Send email over the pooled connection. smtplib is blocking, so run it on a
+    # worker thread to keep the event loop free for other requests.
+    async with _smtp_lock:
+        await asyncio.to_thread(_send_message_sync, msg, SMTP_HOST, SMTP_PORT, SMTP_USERNAME, SMTP_PASSWORD)
+
+
 @app.post("/api/send_email")
 async def send_email(req: EmailRequest):
     """
@@ -278,24 +805,7 @@ async def send_email(req: EmailRequest):
     exist, they will be attached from disk (legacy support).
     """
     try:
-        SMTP_HOST = os.getenv("SMTP_HOST")
-        SMTP_PORT = int(os.getenv("SMTP_PORT") or 587)
-        SMTP_USERNAME = os.getenv("SMTP_USERNAME")
-        SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
-        FROM_EMAIL = os.getenv("FROM_EMAIL")
-
-        # Basic debug prints (safe-ish). Remove in production if sensitive.
-        print("SMTP_HOST:", SMTP_HOST)
-        print("SMTP_USERNAME:", SMTP_USERNAME)
-        if SMTP_PASSWORD:
-            print("SMTP_PASSWORD: [REDACTED]")
-
-        # Build message
-        msg = EmailMessage()
-        msg["From"] = FROM_EMAIL or SMTP_USERNAME or "no-reply@example.com"
-        msg["To"] = req.to_email
-        msg["Subject"] = req.subject
-        msg.set_content(req.body)
+        msg = build_email_message(req.to_email, req.subject, req.body)
 
         # Attach in-memory base64 images (preferred)
         for idx, data_uri in enumerate(req.image_data_b64 or []):
@@ -303,14 +813,24 @@ async def send_email(req: EmailRequest):
                 continue
             # expected form: data:image/jpeg;base64,AAAA...
             if data_uri.startswith("data:"):
-                header, b64data = data_uri.split(",", 1)
+                # Only look for the comma in the first 64 chars (real headers are < 40) so a
+                # malformed multi-MB blob is never scanned end to end.
+                comma = data_uri.find(",", 0, DATA_URI_MAX_HEADER)
+                if comma < 0:
+                    print(f"[WARN] Skipping image_data_b64 idx={idx}: malformed data URI")
+                    continue
+                header = data_uri[:comma]
+                if not header.endswith(";base64"):
+                    print(f"[WARN] Skipping image_data_b64 idx={idx}: data URI is not base64")
+                    continue
+                b64data = data_uri[comma + 1:]
                 subtype = "jpeg"
                 if "png" in header:
                     subtype = "png"
                 filename = f"attachment_{idx}.{subtype}"
                 try:
-                    img_bytes = base64.b64decode(b64data)
-                    msg.add_attachment(img_bytes, maintype="image", subtype=subtype, filename=filename)
+                    img_bytes = base64.b64decode(b64data, validate=True)
+                    add_image_attachment(msg, img_bytes, subtype, filename)
                 except Exception as e:
                     print(f"[WARN] Failed to decode/attach image_data_b64 idx={idx}: {e}")
 
@@ -320,24 +840,70 @@ async def send_email(req: EmailRequest):
                 filepath = url.replace("/static", STATIC_DIR)
                 try:
                     if os.path.exists(filepath):
-                        with open(filepath, "rb") as f:
-                            data = f.read()
+                        data = await asyncio.to_thread(_read_file_sync, filepath)
                         ext = os.path.splitext(filepath)[1].lower().lstrip(".")
                         subtype = "jpeg" if ext in ("jpg", "jpeg") else (ext or "octet-stream")
-                        msg.add_attachment(data, maintype="image", subtype=subtype, filename=os.path.basename(filepath))
+                        add_image_attachment(msg, data, subtype, os.path.basename(filepath))
                 except Exception as e:
                     print(f"[WARN] Failed to attach disk file {filepath}: {e}")
 
-        # Send email
-        server = smtplib.SMTP(SMTP_HOST, SMTP_PORT)
-        server.starttls()
-        if SMTP_USERNAME and SMTP_PASSWORD:
-            server.login(SMTP_USERNAME, SMTP_PASSWORD)
-        server.send_message(msg)
-        server.quit()
+        await deliver_email(msg)
 
         return {"status": "sent"}
     except Exception as e:
         # return error text (useful for debugging). In prod, sanitize this.
         return {"status": "error", "error": str(e)}
 
+
+@app.post("/api/send_email_with_predict")
+async def send_email_with_predict(
+    to_email: str = Form(...),
+    subject: str = Form(...),
+    body: str = Form(...),
+    images: list[UploadFile] = File(...),
+):
+    """
+    Preferred fast path: upload the road images directly (multipart), run YOLO once, and
+    email the annotated results. The JPEG bytes are attached as-is, skipping the
+    base64 data URI round-trip of /api/predict -> /api/send_email.
+    Returns the status plus the pothole count for each image. Like /api/send_email,
+    failures (including undecodable uploads) return {"status": "error", "error": ...}.
+    """
+    try:
+        filenames = []
+        contents_list = []
+        for upload in images:
+            filenames.append(upload.filename.replace("/", "_"))
+            contents_list.append(await upload.read())
+
+        decoded = await decode_all(contents_list)
+        for filename, img_np in zip(filenames, decoded):
+            if isinstance(img_np, Exception):
+                return {"status": "error", "error": f"Failed to decode {filename}: {str(img_np)}"}
+        img_list = list(decoded)
+
+        model_inputs, scales = zip(*[resize_for_model(img_np) for img_np in img_list])
+        results = run_model(list(model_inputs))
+
+        # Drawing and JPEG encoding release the GIL, so do them concurrently on worker threads.
+        encoded = await asyncio.gather(
+            *[
+                asyncio.to_thread(render_result_jpeg, img_np, result, scale)
+                for img_np, scale, result in zip(img_list, scales, results)
+            ]
+        )
+
+        msg = build_email_message(to_email, subject, body)
+        counts = []
+        for filename, img_bytes, result in zip(filenames, encoded, results):
+            attachment_name = "result_" + os.path.splitext(filename)[0] + ".jpg"
+            add_image_attachment(msg, img_bytes, "jpeg", attachment_name)
+            counts.append({"original_filename": filename, "count": len(result.boxes)})
+
+        await deliver_email(msg)
+
+        return {"status": "sent", "results": counts}
+    except Exception as e:
+        # return error text (useful for debugging). In prod, sanitize this.
+        return {"status": "error", "error": str(e)}
+